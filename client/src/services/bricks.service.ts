@@ -20,7 +20,6 @@ interface BrickColor {
 interface BrickData {
   element_id: string;
   brick_type: string;
-  num_colors: number;
   colors: BrickColor[];
 }
 
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Run the whole palette pipeline:
+
+1. generate_with_substitutes builds bricks_and_plates_with_substitutes.json
+2. analyze_missing_colors, analyze_substitutes and create_universal_palette,
+   which only read the JSON files and write independent outputs, then run in
+   parallel worker processes
+
+Usage: python marketplaces/pick_a_brick  (or python -m marketplaces.pick_a_brick)
+"""
+
+import importlib
+import io
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from pathlib import Path
+
+# The scripts import their shared helpers as top-level modules
+sys.path.insert(0, str(Path(__file__).parent))
+
+import generate_with_substitutes  # noqa: E402
+from _palette_common import buffered_stdout  # noqa: E402
+
+# Scripts that can run concurrently once the substitutes file exists
+PARALLEL_SCRIPTS = [
+    "analyze_missing_colors",
+    "analyze_substitutes",
+    "create_universal_palette",
+]
+
+
+def _run(module_name: str) -> str:
+    """Run a script's main() in a worker process and return what it printed."""
+    module = importlib.import_module(module_name)
+    buffer = io.StringIO()
+    with redirect_stdout(buffer):
+        module.main()
+    return buffer.getvalue()
+
+
+def main():
+    with buffered_stdout():
+        generate_with_substitutes.main()
+
+    # CPU-bound, so use processes rather than threads. Output is printed in a
+    # fixed order once each script finishes, rather than interleaved.
+    with ProcessPoolExecutor(max_workers=len(PARALLEL_SCRIPTS)) as executor:
+        for output in executor.map(_run, PARALLEL_SCRIPTS):
+            sys.stdout.write(output)
+            sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
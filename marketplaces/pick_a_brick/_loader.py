@@ -0,0 +1,103 @@
+"""
+Shared JSON loading and writing for the pick_a_brick scripts.
+
+The scripts all re-read the same bricks_and_plates*.json files on every run.
+load_json_cached() keeps parsed results in memory for the life of the process
+and writes a pickle sidecar next to each JSON file, which later runs load
+instead of re-parsing the JSON as long as the sidecar is newer.
+
+orjson is used for parsing and writing when installed, with the stdlib json
+module as a fallback.
+"""
+
+import json
+import os
+import pickle
+import tempfile
+from pathlib import Path
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, fall back to the stdlib json module
+    orjson = None  # type: ignore[assignment]
+
+
+# (resolved path, JSON mtime) -> parsed data
+_cache: dict[tuple[Path, float], Any] = {}
+
+
+def _parse_json(path: Path) -> Any:
+    """Parse a JSON file, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(path.read_bytes())
+
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_sidecar(sidecar: Path, data: Any) -> None:
+    """
+    Write the pickle sidecar atomically.
+    
+    The pickle goes to a temp file in the same directory, which then replaces
+    the sidecar. Another process loading the same JSON at the same time
+    therefore never sees a truncated, half-written pickle.
+    """
+    try:
+        fd, tmp_name = tempfile.mkstemp(dir=sidecar.parent, prefix=f'.{sidecar.stem}.', suffix='.pkl')
+    except OSError:
+        return  # The sidecar is only an optimization
+    
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(data, f, protocol=5)
+        os.replace(tmp_name, sidecar)
+    except OSError:
+        try:
+            os.unlink(tmp_name)
+        except OSError:
+            pass
+
+
+def load_json_cached(path: str | Path) -> Any:
+    """
+    Load a JSON file, reusing earlier parses where possible.
+
+    Looks in the in-process cache first, then in a .pkl sidecar next to the
+    file if it is at least as new as the JSON. Otherwise parses the JSON and
+    refreshes the sidecar.
+    """
+    path = Path(path).resolve()
+    mtime = path.stat().st_mtime
+    key = (path, mtime)
+
+    if key in _cache:
+        return _cache[key]
+
+    sidecar = path.with_suffix('.pkl')
+    data = None
+
+    if sidecar.exists() and sidecar.stat().st_mtime >= mtime:
+        try:
+            with open(sidecar, 'rb') as f:
+                data = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            data = None  # Corrupt or unreadable sidecar, re-parse below
+
+    if data is None:
+        data = _parse_json(path)
+        _write_sidecar(sidecar, data)
+
+    _cache[key] = data
+    return data
+
+
+def write_json(path: str | Path, data: Any) -> None:
+    """Write data as JSON indented by two spaces, using orjson when it is installed."""
+    if orjson is not None:
+        Path(path).write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+        return
+
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
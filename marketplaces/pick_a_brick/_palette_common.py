@@ -0,0 +1,138 @@
+"""
+Helpers shared by the pick_a_brick palette scripts.
+
+Color sets are represented as int bitmasks over a small universe of color
+names (a few dozen), so unions, intersections and differences are single
+integer operations instead of hash-set work.
+"""
+
+import io
+import sys
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager, redirect_stdout
+from functools import cache
+from itertools import groupby
+from typing import Any
+
+
+@cache
+def parse_brick_type(brick_type: str) -> tuple[str, int, int]:
+    """Parse a brick type string like "BRICK 2X4" into (type, width, length)."""
+    parts = brick_type.split()
+    type_name = parts[0]  # "BRICK" or "PLATE"
+    dimensions = parts[1].split("X")
+    width = int(dimensions[0])
+    length = int(dimensions[1])
+    return type_name, width, length
+
+
+def calculate_size(width: int, length: int) -> int:
+    """Calculate the total size (area) of a brick."""
+    return width * length
+
+
+def build_color_universe(pieces: Iterable[dict[str, Any]]) -> dict[str, int]:
+    """
+    Assign every color name used by the given pieces a bit index.
+
+    Indices follow alphabetical order, so names decoded from a mask with
+    mask_to_names() come out sorted without sorting them again.
+    """
+    names = {color['color_name'] for piece in pieces for color in piece['colors']}
+    return {name: i for i, name in enumerate(sorted(names))}
+
+
+def colors_mask(
+    colors: Iterable[dict[str, Any]],
+    color_ids: dict[str, int],
+    direct_only: bool = False
+) -> int:
+    """
+    Encode a piece's list of color entries as a bitmask in a single pass.
+    
+    With direct_only, substitute colors (is_substitute) are left out.
+    """
+    mask = 0
+    for color in colors:
+        if direct_only and color.get('is_substitute'):
+            continue
+        mask |= 1 << color_ids[color['color_name']]
+    return mask
+
+
+def mask_to_names(mask: int, id_to_name: list[str]) -> list[str]:
+    """Decode a bitmask into color names, in bit index (alphabetical) order."""
+    names = []
+    while mask:
+        low_bit = mask & -mask
+        names.append(id_to_name[low_bit.bit_length() - 1])
+        mask ^= low_bit
+    return names
+
+
+def iter_parsed(pieces: Iterable[dict[str, Any]], color_ids: dict[str, int]) -> Iterator[dict[str, Any]]:
+    """Yield each piece with its parsed dimensions, size and color mask."""
+    for piece in pieces:
+        brick_type = piece['brick_type']
+        type_name, width, length = parse_brick_type(brick_type)
+
+        yield {
+            'element_id': piece['element_id'],
+            'brick_type': brick_type,
+            'type_name': type_name,
+            'width': width,
+            'length': length,
+            'size': calculate_size(width, length),
+            'colors_data': piece['colors'],
+            'color_mask': colors_mask(piece['colors'], color_ids)
+        }
+
+
+def group_by_type(parsed: Iterable[dict[str, Any]]) -> dict[str, list[dict[str, Any]]]:
+    """Group parsed pieces by type name (BRICK, PLATE), each sorted by size."""
+    by_type: dict[str, list[dict[str, Any]]] = {}
+    for piece in parsed:
+        by_type.setdefault(piece['type_name'], []).append(piece)
+
+    for pieces in by_type.values():
+        pieces.sort(key=lambda x: x['size'])
+
+    return by_type
+
+
+def cumulative_smaller_colors(by_type: dict[str, list[dict[str, Any]]]) -> dict[str, int]:
+    """
+    Map each brick_type to the mask of colors available in strictly smaller
+    pieces of the same type.
+
+    One smallest-first pass per type keeps a running union; pieces of equal
+    size all see the union from before their size group, so they don't count
+    each other.
+    """
+    smaller_colors: dict[str, int] = {}
+
+    for pieces in by_type.values():
+        running = 0
+        for _, group in groupby(pieces, key=lambda x: x['size']):
+            same_size = list(group)
+            for piece in same_size:
+                smaller_colors[piece['brick_type']] = running
+            for piece in same_size:
+                running |= piece['color_mask']
+
+    return smaller_colors
+
+
+@contextmanager
+def buffered_stdout() -> Iterator[None]:
+    """
+    Collect everything printed inside the block and write it to stdout in one
+    go at the end, instead of paying for a write per print() call.
+    """
+    buffer = io.StringIO()
+    try:
+        with redirect_stdout(buffer):
+            yield
+    finally:
+        sys.stdout.write(buffer.getvalue())
+        sys.stdout.flush()
@@ -5,80 +5,81 @@ Script to analyze the generated substitutes file and identify:
 2. Color differences between plates and bricks
 """
 
-import json
 from pathlib import Path
 from collections import defaultdict
-from typing import Set, Dict, List
+from bisect import bisect_left
 
-
-def parse_brick_type(brick_type: str) -> tuple[str, int, int]:
-    """Parse a brick type string like "BRICK 2X4" into (type, width, length)."""
-    parts = brick_type.split()
-    type_name = parts[0]  # "BRICK" or "PLATE"
-    dimensions = parts[1].split("X")
-    width = int(dimensions[0])
-    length = int(dimensions[1])
-    return type_name, width, length
-
-
-def calculate_size(width: int, length: int) -> int:
-    """Calculate the total size (area) of a brick."""
-    return width * length
+from _loader import load_json_cached
+from _palette_common import (
+    buffered_stdout,
+    build_color_universe,
+    cumulative_smaller_colors,
+    group_by_type,
+    iter_parsed,
+    mask_to_names,
+)
 
 
 def main():
-    # Load both files
-    original_file = Path(__file__).parent.parent.parent / "server" / "public" / "bricks_and_plates.json"
+    # Load the substitutes file
     substitutes_file = Path(__file__).parent.parent.parent / "server" / "public" / "bricks_and_plates_with_substitutes.json"
     
-    with open(original_file, 'r') as f:
-        original_data = json.load(f)
-    
-    with open(substitutes_file, 'r') as f:
-        substitutes_data = json.load(f)
+    substitutes_data = load_json_cached(substitutes_file)
     
     print("=" * 80)
     print("SUBSTITUTE ANALYSIS")
     print("=" * 80)
     print()
     
+    color_ids = build_color_universe(substitutes_data)
+    id_to_name = list(color_ids)
+    
     # Track colors by type (BRICK vs PLATE)
-    brick_colors = set()
-    plate_colors = set()
+    brick_colors = 0
+    plate_colors = 0
     
     # Track which pieces have colors (including substitutes)
-    piece_info = {}
+    parsed = list(iter_parsed(substitutes_data, color_ids))
+    piece_info = {info['brick_type']: info for info in parsed}
     
-    for piece in substitutes_data:
-        brick_type = piece['brick_type']
-        type_name, width, length = parse_brick_type(brick_type)
-        size = calculate_size(width, length)
-        
-        colors_with_subs = set()
-        colors_direct = set()
-        missing_subs = []
+    # Substitute totals for the summary
+    total_colors_added = 0
+    total_pieces_with_subs = 0
+    
+    for info in parsed:
+        colors_direct = 0
+        num_subs = 0
         
-        for color in piece['colors']:
-            color_name = color['color_name']
-            colors_with_subs.add(color_name)
-            
-            if not color.get('is_substitute'):
-                colors_direct.add(color_name)
-            
-            # Track by type
-            if type_name == 'BRICK':
-                brick_colors.add(color_name)
+        for color in info['colors_data']:
+            if color.get('is_substitute'):
+                num_subs += 1
             else:
-                plate_colors.add(color_name)
+                colors_direct |= 1 << color_ids[color['color_name']]
+        
+        info['colors_direct'] = colors_direct
+        
+        if num_subs:
+            total_pieces_with_subs += 1
+            total_colors_added += num_subs
         
-        piece_info[brick_type] = {
-            'type_name': type_name,
-            'size': size,
-            'width': width,
-            'length': length,
-            'colors_with_subs': colors_with_subs,
-            'colors_direct': colors_direct
-        }
+        # Track by type
+        if info['type_name'] == 'BRICK':
+            brick_colors |= info['color_mask']
+        else:
+            plate_colors |= info['color_mask']
+    
+    # Index pieces once so the reports below don't rescan piece_info:
+    # pieces of each type sorted by size, colors available in strictly smaller
+    # pieces, and (type, color) -> brick types that have the color, smallest first
+    pieces_by_type = group_by_type(parsed)
+    sizes_by_type = {t: [p['size'] for p in pieces] for t, pieces in pieces_by_type.items()}
+    smaller_colors = cumulative_smaller_colors(pieces_by_type)
+    
+    color_index = defaultdict(list)
+    for type_name, pieces in pieces_by_type.items():
+        for info in pieces:
+            for color in mask_to_names(info['color_mask'], id_to_name):
+                color_index[(type_name, color)].append(info['brick_type'])
     
     # Find colors that should have substitutes but don't
     print("=" * 80)
@@ -90,33 +91,24 @@ def main():
         brick_type = piece['brick_type']
         info = piece_info[brick_type]
         
-        # Find smaller pieces
-        smaller_pieces = [
-            p for bt, p in piece_info.items()
-            if p['type_name'] == info['type_name'] and p['size'] < info['size']
-        ]
-        
-        if not smaller_pieces:
-            continue
-        
-        # Get all colors available in smaller pieces (with substitutes)
-        all_smaller_colors = set()
-        for smaller in smaller_pieces:
-            all_smaller_colors.update(smaller['colors_with_subs'])
-        
         # Find what's still missing
-        missing = all_smaller_colors - info['colors_with_subs']
+        missing_mask = smaller_colors[brick_type] & ~info['color_mask']
         
-        if missing:
+        if missing_mask:
+            missing = mask_to_names(missing_mask, id_to_name)
+            type_name = info['type_name']
+            smaller_pieces = pieces_by_type[type_name][
+                :bisect_left(sizes_by_type[type_name], info['size'])
+            ]
+            
             print(f"{brick_type} (Size: {info['width']}x{info['length']})")
             print(f"  Still missing {len(missing)} colors:")
-            for color in sorted(missing):
+            for color in missing:
                 # Find which smaller pieces have this color
+                color_bit = 1 << color_ids[color]
                 has_this = [
-                    bt for bt, p in piece_info.items()
-                    if p['type_name'] == info['type_name'] 
-                    and p['size'] < info['size']
-                    and color in p['colors_with_subs']
+                    p['brick_type'] for p in smaller_pieces
+                    if p['color_mask'] & color_bit
                 ]
                 print(f"    - {color}")
                 print(f"      Available in: {', '.join(has_this)}")
@@ -128,37 +120,31 @@ def main():
     print("=" * 80)
     print()
     
-    only_bricks = brick_colors - plate_colors
-    only_plates = plate_colors - brick_colors
+    only_bricks = mask_to_names(brick_colors & ~plate_colors, id_to_name)
+    only_plates = mask_to_names(plate_colors & ~brick_colors, id_to_name)
     both = brick_colors & plate_colors
     
-    print(f"Total unique colors in BRICKS: {len(brick_colors)}")
-    print(f"Total unique colors in PLATES: {len(plate_colors)}")
-    print(f"Colors in BOTH: {len(both)}")
+    print(f"Total unique colors in BRICKS: {brick_colors.bit_count()}")
+    print(f"Total unique colors in PLATES: {plate_colors.bit_count()}")
+    print(f"Colors in BOTH: {both.bit_count()}")
     print()
     
     if only_bricks:
         print(f"Colors ONLY in BRICKS ({len(only_bricks)}):")
-        for color in sorted(only_bricks):
-            # Find which bricks have this color
-            bricks_with_color = [
-                bt for bt, p in piece_info.items()
-                if p['type_name'] == 'BRICK' and color in p['colors_with_subs']
-            ]
-            print(f"  - {color}")
-            print(f"    Available in: {', '.join(bricks_with_color)}")
+        # Each color with the bricks that have it
+        print("\n".join(
+            f"  - {color}\n    Available in: {', '.join(color_index[('BRICK', color)])}"
+            for color in only_bricks
+        ))
         print()
     
     if only_plates:
         print(f"Colors ONLY in PLATES ({len(only_plates)}):")
-        for color in sorted(only_plates):
-            # Find which plates have this color
-            plates_with_color = [
-                bt for bt, p in piece_info.items()
-                if p['type_name'] == 'PLATE' and color in p['colors_with_subs']
-            ]
-            print(f"  - {color}")
-            print(f"    Available in: {', '.join(plates_with_color)}")
+        # Each color with the plates that have it
+        print("\n".join(
+            f"  - {color}\n    Available in: {', '.join(color_index[('PLATE', color)])}"
+            for color in only_plates
+        ))
         print()
     
     # Detailed breakdown by piece size
@@ -168,16 +154,14 @@ def main():
     print()
     
     for type_name in ['BRICK', 'PLATE']:
-        pieces = [(bt, p) for bt, p in piece_info.items() if p['type_name'] == type_name]
-        pieces.sort(key=lambda x: x[1]['size'])
-        
         print(f"\n{type_name}S:")
         print("-" * 80)
         
-        for brick_type, info in pieces:
-            direct_count = len(info['colors_direct'])
-            substitute_count = len(info['colors_with_subs']) - direct_count
-            total_count = len(info['colors_with_subs'])
+        for info in pieces_by_type.get(type_name, []):
+            brick_type = info['brick_type']
+            direct_count = info['colors_direct'].bit_count()
+            substitute_count = info['color_mask'].bit_count() - direct_count
+            total_count = info['color_mask'].bit_count()
             
             print(f"{brick_type:15} (Size: {info['size']:2}): "
                   f"Direct: {direct_count:2}, Substitutes: {substitute_count:2}, Total: {total_count:2}")
@@ -189,21 +173,13 @@ def main():
     print("=" * 80)
     print()
     
-    total_colors_added = 0
-    total_pieces_with_subs = 0
-    
-    for piece in substitutes_data:
-        subs = [c for c in piece['colors'] if c.get('is_substitute')]
-        if subs:
-            total_pieces_with_subs += 1
-            total_colors_added += len(subs)
-    
     print(f"Total pieces analyzed: {len(substitutes_data)}")
     print(f"Pieces with substitutes: {total_pieces_with_subs}")
     print(f"Total substitute colors added: {total_colors_added}")
-    print(f"Total unique colors across all pieces: {len(brick_colors | plate_colors)}")
+    print(f"Total unique colors across all pieces: {(brick_colors | plate_colors).bit_count()}")
 
 
 if __name__ == "__main__":
-    main()
+    with buffered_stdout():
+        main()
 
@@ -9,19 +9,16 @@ Only keeps colors that:
 This ensures all colors are completely interchangeable between bricks and plates.
 """
 
-import json
 from pathlib import Path
-from typing import Set, Dict, List
 
-
-def parse_brick_type(brick_type: str) -> tuple[str, int, int]:
-    """Parse a brick type string like "BRICK 2X4" into (type, width, length)."""
-    parts = brick_type.split()
-    type_name = parts[0]  # "BRICK" or "PLATE"
-    dimensions = parts[1].split("X")
-    width = int(dimensions[0])
-    length = int(dimensions[1])
-    return type_name, width, length
+from _loader import load_json_cached, write_json
+from _palette_common import (
+    buffered_stdout,
+    build_color_universe,
+    colors_mask,
+    mask_to_names,
+    parse_brick_type,
+)
 
 
 def main():
@@ -29,8 +26,7 @@ def main():
     input_file = Path(__file__).parent.parent.parent / "server" / "public" / "bricks_and_plates_with_substitutes.json"
     output_file = Path(__file__).parent.parent.parent / "server" / "public" / "bricks_and_plates_universal.json"
     
-    with open(input_file, 'r') as f:
-        data = json.load(f)
+    data = load_json_cached(input_file)
     
     print("=" * 80)
     print("CREATING UNIVERSAL COLOR PALETTE")
@@ -51,48 +47,44 @@ def main():
         print("❌ Could not find BRICK 1X1 or PLATE 1X1")
         return
     
-    # Get colors from each (only direct colors, not substitutes)
-    brick_1x1_colors = {
-        c['color_name'] for c in brick_1x1['colors']
-        if not c.get('is_substitute')
-    }
+    color_ids = build_color_universe(data)
+    id_to_name = list(color_ids)
     
-    plate_1x1_colors = {
-        c['color_name'] for c in plate_1x1['colors']
-        if not c.get('is_substitute')
-    }
+    # Get colors from each (only direct colors, not substitutes)
+    brick_1x1_colors = colors_mask(brick_1x1['colors'], color_ids, direct_only=True)
+    plate_1x1_colors = colors_mask(plate_1x1['colors'], color_ids, direct_only=True)
     
     # Find universal colors (exist in both)
-    universal_colors = brick_1x1_colors & plate_1x1_colors
+    universal_mask = brick_1x1_colors & plate_1x1_colors
+    universal_colors = mask_to_names(universal_mask, id_to_name)
     
-    print(f"🧱 BRICK 1X1 direct colors: {len(brick_1x1_colors)}")
-    print(f"📋 PLATE 1X1 direct colors: {len(plate_1x1_colors)}")
+    print(f"🧱 BRICK 1X1 direct colors: {brick_1x1_colors.bit_count()}")
+    print(f"📋 PLATE 1X1 direct colors: {plate_1x1_colors.bit_count()}")
     print(f"✅ Universal colors (in both): {len(universal_colors)}")
     print()
     
     # Colors that will be removed
-    brick_only = brick_1x1_colors - plate_1x1_colors
-    plate_only = plate_1x1_colors - brick_1x1_colors
+    brick_only = mask_to_names(brick_1x1_colors & ~plate_1x1_colors, id_to_name)
+    plate_only = mask_to_names(plate_1x1_colors & ~brick_1x1_colors, id_to_name)
     
     if brick_only:
         print(f"🔴 Removing {len(brick_only)} BRICK-only colors:")
-        for color in sorted(brick_only):
-            print(f"   - {color}")
+        print("\n".join(f"   - {color}" for color in brick_only))
         print()
     
     if plate_only:
         print(f"🔴 Removing {len(plate_only)} PLATE-only colors:")
-        for color in sorted(plate_only):
-            print(f"   - {color}")
+        print("\n".join(f"   - {color}" for color in plate_only))
         print()
     
     print(f"✅ Universal color palette ({len(universal_colors)} colors):")
-    for color in sorted(universal_colors):
-        print(f"   - {color}")
+    if universal_colors:
+        print("\n".join(f"   - {color}" for color in universal_colors))
     print()
     
     # Filter all pieces to only include universal colors
     filtered_data = []
+    color_masks_by_type = {'BRICK': 0, 'PLATE': 0}  # Union of kept colors per type
     total_colors_before = 0
     total_colors_after = 0
     
@@ -104,11 +96,17 @@ def main():
     for piece in data:
         total_colors_before += len(piece['colors'])
         
-        # Filter colors to only universal ones
-        filtered_colors = [
-            color for color in piece['colors']
-            if color['color_name'] in universal_colors
-        ]
+        # Filter colors to only universal ones, keeping the original order
+        piece_mask = colors_mask(piece['colors'], color_ids)
+        kept_mask = piece_mask & universal_mask
+        
+        if kept_mask == piece_mask:
+            filtered_colors = piece['colors']
+        else:
+            filtered_colors = [
+                color for color in piece['colors']
+                if kept_mask >> color_ids[color['color_name']] & 1
+            ]
         
         total_colors_after += len(filtered_colors)
         
@@ -116,11 +114,13 @@ def main():
             filtered_piece = {
                 'element_id': piece['element_id'],
                 'brick_type': piece['brick_type'],
-                'num_colors': len(filtered_colors),
                 'colors': filtered_colors
             }
             filtered_data.append(filtered_piece)
             
+            type_name, _, _ = parse_brick_type(piece['brick_type'])
+            color_masks_by_type[type_name] |= kept_mask
+            
             removed_count = len(piece['colors']) - len(filtered_colors)
             status = "✅" if removed_count == 0 else f"🔧 (-{removed_count})"
             print(f"{status} {piece['brick_type']:15} {len(piece['colors']):2} → {len(filtered_colors):2} colors")
@@ -144,46 +144,32 @@ def main():
     print("=" * 80)
     print()
     
-    bricks_by_type = {'BRICK': [], 'PLATE': []}
-    
-    for piece in filtered_data:
-        type_name, _, _ = parse_brick_type(piece['brick_type'])
-        bricks_by_type[type_name].append(piece)
-    
     # Check if all colors are now available in both types
-    all_brick_colors = set()
-    all_plate_colors = set()
-    
-    for piece in bricks_by_type['BRICK']:
-        for color in piece['colors']:
-            all_brick_colors.add(color['color_name'])
-    
-    for piece in bricks_by_type['PLATE']:
-        for color in piece['colors']:
-            all_plate_colors.add(color['color_name'])
+    all_brick_colors = color_masks_by_type['BRICK']
+    all_plate_colors = color_masks_by_type['PLATE']
     
-    print(f"Colors available in BRICKS: {len(all_brick_colors)}")
-    print(f"Colors available in PLATES: {len(all_plate_colors)}")
+    print(f"Colors available in BRICKS: {all_brick_colors.bit_count()}")
+    print(f"Colors available in PLATES: {all_plate_colors.bit_count()}")
     
-    if all_brick_colors == all_plate_colors == universal_colors:
+    if all_brick_colors == all_plate_colors == universal_mask:
         print("✅ Perfect match! All colors are available in both BRICKS and PLATES")
     else:
         print("⚠️  Mismatch detected!")
-        if all_brick_colors != universal_colors:
-            print(f"   BRICK colors don't match: {all_brick_colors - universal_colors}")
-        if all_plate_colors != universal_colors:
-            print(f"   PLATE colors don't match: {all_plate_colors - universal_colors}")
+        if all_brick_colors != universal_mask:
+            print(f"   BRICK colors don't match: {set(mask_to_names(all_brick_colors & ~universal_mask, id_to_name))}")
+        if all_plate_colors != universal_mask:
+            print(f"   PLATE colors don't match: {set(mask_to_names(all_plate_colors & ~universal_mask, id_to_name))}")
     
     print()
     
     # Write output file
-    with open(output_file, 'w') as f:
-        json.dump(filtered_data, f, indent=2)
+    write_json(output_file, filtered_data)
     
     print(f"💾 Saved to: {output_file}")
     print()
 
 
 if __name__ == "__main__":
-    main()
+    with buffered_stdout():
+        main()
 
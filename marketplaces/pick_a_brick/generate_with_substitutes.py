@@ -5,31 +5,27 @@ for missing colors. For each piece that doesn't have a color, adds that color
 with substitute pieces that can fill the same space.
 """
 
-import json
+from bisect import bisect_left
 from pathlib import Path
-from typing import List, Dict, Any, Tuple, Optional
+from typing import List, Dict, Any, Optional
 
-
-def parse_brick_type(brick_type: str) -> Tuple[str, int, int]:
-    """Parse a brick type string like "BRICK 2X4" into (type, width, length)."""
-    parts = brick_type.split()
-    type_name = parts[0]  # "BRICK" or "PLATE"
-    dimensions = parts[1].split("X")
-    width = int(dimensions[0])
-    length = int(dimensions[1])
-    return type_name, width, length
-
-
-def calculate_size(width: int, length: int) -> int:
-    """Calculate the total size (area) of a brick."""
-    return width * length
+from _loader import load_json_cached, write_json
+from _palette_common import (
+    buffered_stdout,
+    build_color_universe,
+    cumulative_smaller_colors,
+    group_by_type,
+    iter_parsed,
+    mask_to_names,
+)
 
 
 def find_efficient_substitute(
     target_width: int,
     target_length: int,
     available_pieces: List[Dict[str, Any]],
-    color_name: str
+    color_name: str,
+    color_lookup: dict[tuple[str, str], dict[str, Any]]
 ) -> Optional[List[Dict[str, Any]]]:
     """
     Find the most efficient combination of smaller pieces to fill target dimensions.
@@ -40,16 +36,22 @@ def find_efficient_substitute(
         target_length: Target length in studs
         available_pieces: List of smaller pieces that have the desired color
         color_name: The color we're looking for
+        color_lookup: Color data keyed by (brick_type, color_name)
         
     Returns:
         List of substitute pieces with quantities, or None if no valid substitute
     """
-    # Filter pieces by those that have the color and are smaller
+    # Filter pieces by those that have the color, are smaller, and evenly
+    # divide the target width, so they are laid in full-width rows along the
+    # length rather than only matching the stud count
     candidates = []
     for piece in available_pieces:
-        if piece['size'] < target_width * target_length:
+        if (
+            piece['size'] < target_width * target_length
+            and target_width % piece['width'] == 0
+        ):
             # Check if this piece has the color
-            color_data = next((c for c in piece['colors_data'] if c['color_name'] == color_name), None)
+            color_data = color_lookup.get((piece['brick_type'], color_name))
             if color_data:
                 candidates.append({
                     'brick_type': piece['brick_type'],
@@ -77,26 +79,22 @@ def find_efficient_substitute(
     remaining_area = total_area_needed
     
     for candidate in candidates:
-        # How many of this piece can we fit?
-        if candidate['width'] <= target_width and candidate['length'] <= target_length:
-            # Calculate how many we need
-            count = 0
-            temp_remaining = remaining_area
-            
-            while temp_remaining >= candidate['size']:
-                count += 1
-                temp_remaining -= candidate['size']
+        # How many of this piece can we fit? Bounded by both the grid it tiles
+        # and the area still left to fill
+        tiles_per_row = target_width // candidate['width']
+        rows = target_length // candidate['length']
+        count = min(tiles_per_row * rows, remaining_area // candidate['size'])
+        
+        if count > 0:
+            remaining_area -= count * candidate['size']
+            substitutes.append({
+                'brick_type': candidate['brick_type'],
+                'element_id': candidate['color_data']['element_id'],
+                'quantity': count
+            })
             
-            if count > 0:
-                remaining_area -= count * candidate['size']
-                substitutes.append({
-                    'brick_type': candidate['brick_type'],
-                    'element_id': candidate['color_data']['element_id'],
-                    'quantity': count
-                })
-                
-                if remaining_area == 0:
-                    break
+            if remaining_area == 0:
+                break
     
     # Verify we filled the area exactly
     if remaining_area == 0:
@@ -124,99 +122,78 @@ def generate_with_substitutes(input_file: Path, output_file: Path):
     """Generate a new JSON file with substitutes for missing colors."""
     
     # Load the data
-    with open(input_file, 'r') as f:
-        bricks_data = json.load(f)
+    bricks_data = load_json_cached(input_file)
     
-    # Parse all bricks and organize by type
-    parsed_bricks = []
-    bricks_by_type = {}
+    color_ids = build_color_universe(bricks_data)
+    id_to_name = list(color_ids)
     
-    for brick in bricks_data:
-        brick_type = brick['brick_type']
-        type_name, width, length = parse_brick_type(brick_type)
-        
-        brick_info = {
-            'element_id': brick['element_id'],
-            'brick_type': brick_type,
-            'type_name': type_name,
-            'width': width,
-            'length': length,
-            'size': calculate_size(width, length),
-            'colors_data': brick['colors'],
-            'num_colors': brick['num_colors']
-        }
-        parsed_bricks.append(brick_info)
-        
-        if type_name not in bricks_by_type:
-            bricks_by_type[type_name] = []
-        bricks_by_type[type_name].append(brick_info)
+    # Parse all bricks and organize by type, sorted by size
+    parsed_bricks = list(iter_parsed(bricks_data, color_ids))
+    bricks_by_type = group_by_type(parsed_bricks)
+    
+    # Colors available in strictly smaller bricks of the same type
+    smaller_colors = cumulative_smaller_colors(bricks_by_type)
+    
+    # Size keys of each type's sorted bricks, to slice out the smaller ones.
+    # Bricks of the same type and size share one slice.
+    sizes_by_type = {t: [b['size'] for b in bricks] for t, bricks in bricks_by_type.items()}
+    smaller_bricks_cache: dict[tuple[str, int], list[dict[str, Any]]] = {}
     
-    # Sort bricks by size within each type
-    for type_name in bricks_by_type:
-        bricks_by_type[type_name].sort(key=lambda x: x['size'])
+    # Index color data by (brick_type, color_name) for constant-time lookups,
+    # and the RGB value of each color name
+    color_lookup: dict[tuple[str, str], dict[str, Any]] = {}
+    rgb_by_color: dict[str, str | None] = {}
+    for b in parsed_bricks:
+        for c in b['colors_data']:
+            color_lookup[(b['brick_type'], c['color_name'])] = c
+            rgb_by_color.setdefault(c['color_name'], c['rgb'])
     
     # Process each brick to add substitutes
     new_bricks_data = []
+    total_substitutes = 0
     
     for brick_info in parsed_bricks:
         type_name = brick_info['type_name']
         current_size = brick_info['size']
         
         # Get all smaller bricks of the same type
-        smaller_bricks = [
-            b for b in bricks_by_type[type_name]
-            if b['size'] < current_size
-        ]
+        smaller_key = (type_name, current_size)
+        smaller_bricks = smaller_bricks_cache.get(smaller_key)
+        if smaller_bricks is None:
+            idx = bisect_left(sizes_by_type[type_name], current_size)
+            smaller_bricks = smaller_bricks_cache[smaller_key] = bricks_by_type[type_name][:idx]
         
-        # Get all colors available in this brick
-        current_colors = {c['color_name'] for c in brick_info['colors_data']}
-        
-        # Get all colors available in smaller bricks
-        all_colors_in_smaller = set()
-        for smaller in smaller_bricks:
-            for color in smaller['colors_data']:
-                all_colors_in_smaller.add(color['color_name'])
-        
-        # Find missing colors
-        missing_colors = all_colors_in_smaller - current_colors
+        # Find colors available in smaller bricks but missing from this one
+        all_colors_in_smaller = smaller_colors[brick_info['brick_type']]
+        missing_colors = mask_to_names(all_colors_in_smaller & ~brick_info['color_mask'], id_to_name)
         
         # Start building the new brick entry
         new_brick = {
             'element_id': brick_info['element_id'],
             'brick_type': brick_info['brick_type'],
-            'num_colors': brick_info['num_colors'],
             'colors': list(brick_info['colors_data'])  # Start with existing colors
         }
         
         # Add missing colors with substitutes
-        for color_name in sorted(missing_colors):
+        for color_name in missing_colors:
             # Find the most efficient substitute
             substitutes = find_efficient_substitute(
                 brick_info['width'],
                 brick_info['length'],
                 smaller_bricks,
-                color_name
+                color_name,
+                color_lookup
             )
             
             if substitutes:
-                # Get RGB value from any smaller brick that has this color
-                rgb_value = None
-                for smaller in smaller_bricks:
-                    color_data = next((c for c in smaller['colors_data'] if c['color_name'] == color_name), None)
-                    if color_data:
-                        rgb_value = color_data['rgb']
-                        break
+                # Get RGB value for this color
+                rgb_value = rgb_by_color.get(color_name)
                 
                 # Get total price from substitutes
                 total_price = 0
                 for sub in substitutes:
-                    # Find the piece and color to get the price
-                    for smaller in smaller_bricks:
-                        if smaller['brick_type'] == sub['brick_type']:
-                            color_data = next((c for c in smaller['colors_data'] if c['color_name'] == color_name), None)
-                            if color_data:
-                                total_price += color_data.get('price', 0) * sub['quantity']
-                                break
+                    color_data = color_lookup[(sub['brick_type'], color_name)]
+                    total_price += color_data.get('price', 0) * sub['quantity']
                 
                 # Add the color with substitutes
                 new_color_entry = {
@@ -229,24 +206,17 @@ def generate_with_substitutes(input_file: Path, output_file: Path):
                 }
                 
                 new_brick['colors'].append(new_color_entry)
-        
-        # Update num_colors to include substitutes
-        new_brick['num_colors'] = len(new_brick['colors'])
+                total_substitutes += 1
         
         new_bricks_data.append(new_brick)
     
     # Write the new file
-    with open(output_file, 'w') as f:
-        json.dump(new_bricks_data, f, indent=2)
+    write_json(output_file, new_bricks_data)
     
     print(f"✅ Generated new file: {output_file}")
     print(f"📊 Total pieces: {len(new_bricks_data)}")
     
     # Statistics
-    total_substitutes = sum(
-        len([c for c in brick['colors'] if c.get('is_substitute')])
-        for brick in new_bricks_data
-    )
     print(f"🔄 Total substitute colors added: {total_substitutes}")
 
 
@@ -268,5 +238,6 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    with buffered_stdout():
+        main()
 
@@ -3,13 +3,19 @@ Final LEGO Pick a Brick scraper - clicks each color to get Element ID and price.
 Based on findings from browser exploration.
 """
 
+import argparse
 import asyncio
 import json
 import os
-from typing import List
-from pydantic import BaseModel, Field
+from collections import Counter
+from typing import TextIO
+from pydantic import BaseModel, Field, TypeAdapter
 from dotenv import load_dotenv
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 from stagehand import Stagehand, StagehandConfig
+from typing_extensions import TypedDict
+
+from _loader import write_json
 
 load_dotenv()
 
@@ -30,6 +36,35 @@ class BrickItem(BaseModel):
     colors: list[ColorVariant] = Field(default=[], description="List of color variants")
 
 
+# Shapes of the data returned by the in-page scripts below. They are validated
+# once per evaluate with TypeAdapters built at import time, so a change in what
+# the page returns fails loudly instead of as missing keys further down.
+# (TypedDict comes from typing_extensions, which pydantic requires on Python < 3.12.)
+
+class _SelectedColor(TypedDict):
+    """Element ID and price of the currently selected color."""
+    elementId: str | None
+    price: float | None
+
+
+class _ColorDetails(_SelectedColor):
+    """One color read by HARVEST_COLORS_JS."""
+    index: int
+    color_name: str
+    rgb: list[int] | None
+    settled: bool  # The click changed both the price and the URL to a new Element ID
+
+
+class _HarvestResult(TypedDict):
+    """Result of HARVEST_COLORS_JS."""
+    clicked: bool
+    colors: list[_ColorDetails]
+
+
+_SELECTED_COLOR = TypeAdapter(_SelectedColor)
+_HARVEST_RESULT = TypeAdapter(_HarvestResult)
+
+
 # Known brick element IDs
 BRICKS_TO_SCRAPE = [
     {"element_id": "3001", "name": "BRICK 2X4"},
@@ -47,136 +82,329 @@ BRICKS_TO_SCRAPE = [
 ]
 
 
-async def scrape_brick_colors(stagehand, base_element_id: str, brick_name: str) -> BrickItem:
-    """Scrape colors for a single brick type by clicking each color."""
-    
-    # Navigate directly to the brick's page
-    url = f"https://www.lego.com/en-us/pick-and-build/pick-a-brick?query={base_element_id}"
-    print(f"  Loading: {url}")
-    await stagehand.page.goto(url)
-    await asyncio.sleep(4)
-    
-    # Click on the brick to show colors
-    print(f"  Clicking on brick...")
-    click_result = await stagehand.page.evaluate("""
-        () => {
-            const btn = document.querySelector('[data-test="pab-item-button"]');
-            if (btn) {
-                btn.click();
-                return {success: true};
+# Where scraped bricks are saved by default
+OUTPUT_FILE = os.path.join(os.path.dirname(__file__), "bricks_and_plates.json")
+
+# Number of browser pages used to scrape bricks concurrently
+PAGE_POOL_SIZE = 4
+
+# How long to wait for the brick button and color list to appear
+WAIT_TIMEOUT_MS = 15000
+
+# In-page scripts, defined once and parameterized through page.evaluate's
+# argument rather than rebuilt per call.
+
+# Clicks the brick to open its colors, waits for the color buttons to appear
+# and stop changing (up to the given timeout in ms), then clicks each color
+# and reads its name, RGB, Element ID (from the URL) and price. Each color
+# click waits for the URL to change, or at most 400ms, and then for the price
+# to re-render. A color whose price still shows the pre-click text is left
+# unsettled, as the price may just not have re-rendered yet.
+HARVEST_COLORS_JS = """
+    async (timeoutMs) => {
+        const RGB_RE = /rgba?\\((\\d+),\\s*(\\d+),\\s*(\\d+)/;
+        const ELEMENT_ID_RE = /selectedElement=(\\d+)/;
+        const PRICE_RE = /\\$([\\d.]+)/;
+        
+        const btn = document.querySelector('[data-test="pab-item-button"]');
+        if (!btn) {
+            return {clicked: false, colors: []};
+        }
+        
+        const COLOR_BLOCK = '[data-test="pab-element-modal-color-block"]';
+        
+        // Find color buttons through their color block's data-test attribute,
+        // which matches exactly and only exists inside the brick's modal
+        const findBlockButtons = () => {
+            const buttons = new Set();
+            for (const block of document.querySelectorAll(COLOR_BLOCK)) {
+                const btn = block.closest('button');
+                if (btn) buttons.add(btn);
             }
-            return {success: false};
+            return Array.from(buttons);
+        };
+        
+        // Resolve once the modal's color buttons are in the DOM and their count
+        // has held steady for 500ms (the list can render in chunks), or after
+        // timeoutMs. Only called after the click, so buttons elsewhere on the
+        // results page can't make it resolve early.
+        const waitForColors = () => new Promise(resolve => {
+            let count = 0;
+            let stableTimer;
+            let timer;
+            let observer;
+            const done = () => {
+                clearTimeout(stableTimer);
+                clearTimeout(timer);
+                observer.disconnect();
+                resolve();
+            };
+            const check = () => {
+                const n = findBlockButtons().length;
+                if (n === count) return;
+                count = n;
+                clearTimeout(stableTimer);
+                if (n > 0) stableTimer = setTimeout(done, 500);
+            };
+            observer = new MutationObserver(check);
+            observer.observe(document.body, {childList: true, subtree: true});
+            timer = setTimeout(done, timeoutMs);
+            check();
+        });
+        
+        btn.click();
+        await waitForColors();
+        
+        // Snapshot the buttons once so later clicks on this page can reuse them
+        // instead of re-running the selector. Matching a class substring is only
+        // a fallback once the wait has timed out without any color blocks.
+        window.__colorBtns = findBlockButtons();
+        if (window.__colorBtns.length === 0) {
+            window.__colorBtns = Array.from(document.querySelectorAll('button[class*="color"]'));
         }
-    """)
-    
-    if not click_result.get('success'):
-        print(f"  ✗ Could not find/click button")
-        return BrickItem(element_id=base_element_id, brick_type=brick_name, num_colors=0, colors=[])
-    
-    await asyncio.sleep(6)  # Wait for colors to load
-    
-    # Get basic info about all colors (name and RGB)
-    print(f"  Getting color information...")
-    colors_basic = await stagehand.page.evaluate("""
-        () => {
-            const colorButtons = document.querySelectorAll('button[class*="color"]');
-            const colors = [];
+        
+        const PRICE_SELECTOR = '[data-test="pab-item-price"]';
+        
+        const priceText = () => {
+            const priceEl = document.querySelector(PRICE_SELECTOR);
+            return priceEl ? priceEl.textContent.trim() : null;
+        };
+        
+        // Resolve with true once the price text differs from prevPrice and shows
+        // a price, or with false once it has not changed for stableMs (colors can
+        // share a price), capped at 2s. Kept on window so the retry path can wait
+        // the same way, for longer.
+        window.__waitForPrice = (prevPrice, stableMs = 150) => new Promise(resolve => {
+            let lastPrice;
+            let stableTimer;
+            let capTimer;
+            let observer;
+            const done = (changed) => {
+                clearTimeout(stableTimer);
+                clearTimeout(capTimer);
+                observer.disconnect();
+                resolve(changed);
+            };
+            const check = () => {
+                const price = priceText();
+                if (price !== prevPrice && price !== null && PRICE_RE.test(price)) {
+                    done(true);
+                } else if (price !== lastPrice) {
+                    lastPrice = price;
+                    clearTimeout(stableTimer);
+                    stableTimer = setTimeout(() => done(false), stableMs);
+                }
+            };
+            observer = new MutationObserver(check);
+            observer.observe(document.body, {childList: true, subtree: true, characterData: true});
+            capTimer = setTimeout(() => done(false), 2000);
+            check();
+        });
+        
+        const waitForUrlChange = (prevUrl) => {
+            let observer;
+            const changed = new Promise(resolve => {
+                const check = () => {
+                    if (window.location.href !== prevUrl) resolve();
+                };
+                observer = new MutationObserver(check);
+                observer.observe(document.body, {childList: true, subtree: true, characterData: true});
+                check();
+            });
+            const timeout = new Promise(resolve => setTimeout(() => resolve(false), 400));
+            return Promise.race([changed.then(() => true), timeout]).finally(() => observer.disconnect());
+        };
+        
+        // Element ID (from the URL) and price of the currently selected color,
+        // kept on window so READ_SELECTED_COLOR_JS can reuse it
+        window.__readSelectedColor = () => {
+            const urlMatch = window.location.href.match(ELEMENT_ID_RE);
+            const elementId = urlMatch ? urlMatch[1] : null;
+            
+            const priceMatch = (priceText() || '').match(PRICE_RE);
+            const price = priceMatch ? parseFloat(priceMatch[1]) : null;
+            
+            return {elementId, price};
+        };
+        
+        const colors = [];
+        
+        // Element ID recorded for the last clicked color. A URL change alone
+        // doesn't prove the page shows this color, since a late update from the
+        // previous click also changes it. So a color only counts as settled if
+        // its ID differs from the one before.
+        let lastElementId = window.__readSelectedColor().elementId;
+        
+        for (const [index, btn] of window.__colorBtns.entries()) {
+            const colorName = btn.getAttribute('aria-label') || btn.getAttribute('title');
+            if (!colorName) continue;
             
-            colorButtons.forEach((btn, index) => {
-                const colorName = btn.getAttribute('aria-label') || btn.getAttribute('title');
-                const colorBlock = btn.querySelector('[data-test="pab-element-modal-color-block"]');
-                
-                let rgb = null;
-                if (colorBlock) {
-                    const bgColor = window.getComputedStyle(colorBlock).backgroundColor;
-                    if (bgColor && bgColor !== 'rgba(0, 0, 0, 0)') {
-                        const rgbMatch = bgColor.match(/rgba?\\((\\d+),\\s*(\\d+),\\s*(\\d+)/);
-                        if (rgbMatch) {
-                            const r = parseInt(rgbMatch[1]).toString(16).padStart(2, '0');
-                            const g = parseInt(rgbMatch[2]).toString(16).padStart(2, '0');
-                            const b = parseInt(rgbMatch[3]).toString(16).padStart(2, '0');
-                            rgb = `#${r}${g}${b}`;
-                        }
+            const colorBlock = btn.querySelector(COLOR_BLOCK);
+            
+            let rgb = null;
+            if (colorBlock) {
+                const bgColor = window.getComputedStyle(colorBlock).backgroundColor;
+                if (bgColor && bgColor !== 'rgba(0, 0, 0, 0)') {
+                    const rgbMatch = bgColor.match(RGB_RE);
+                    if (rgbMatch) {
+                        // Formatted as hex in Python
+                        rgb = [+rgbMatch[1], +rgbMatch[2], +rgbMatch[3]];
                     }
                 }
-                
-                if (colorName) {
-                    colors.push({
-                        index: index,
-                        color_name: colorName,
-                        rgb: rgb
-                    });
-                }
-            });
+            }
+            
+            const prevUrl = window.location.href;
+            const prevPrice = priceText();
+            btn.click();
+            const urlChanged = await waitForUrlChange(prevUrl);
+            let priceChanged = false;
+            if (urlChanged) {
+                // The URL can update before the price element re-renders
+                priceChanged = await window.__waitForPrice(prevPrice);
+            }
+            
+            const selected = window.__readSelectedColor();
+            const settled = urlChanged && priceChanged && selected.elementId !== null && selected.elementId !== lastElementId;
+            lastElementId = selected.elementId;
             
-            return colors;
+            colors.push({index, color_name: colorName, rgb, settled, ...selected});
+        }
+        
+        return {clicked: true, colors};
+    }
+"""
+
+# Clicks the color button at the given index of window.__colorBtns, returning
+# the price text shown before the click
+CLICK_COLOR_JS = """
+    (i) => {
+        const btn = window.__colorBtns && window.__colorBtns[i];
+        if (btn) {
+            const priceEl = document.querySelector('[data-test="pab-item-price"]');
+            const prevPrice = priceEl ? priceEl.textContent.trim() : null;
+            btn.click();
+            return {success: true, prevPrice};
         }
-    """)
+        return {success: false, prevPrice: null};
+    }
+"""
+
+# Element ID and price of the currently selected color, once the price no
+# longer shows the given pre-click text (or holds steady for stableMs)
+READ_SELECTED_COLOR_JS = """
+    async ({prevPrice, stableMs}) => {
+        await window.__waitForPrice(prevPrice, stableMs);
+        return window.__readSelectedColor();
+    }
+"""
+
+# Resolves once the page URL differs from the given one
+URL_CHANGED_JS = "url => window.location.href !== url"
+
+# How long a retried color click may take to update the URL
+COLOR_RETRY_TIMEOUT_MS = 3000
+
+# How long a retried color's price must hold steady before it is taken as
+# unchanged, as long as the fixed wait the scraper used to make per color
+PRICE_RETRY_STABLE_MS = 1500
+
+
+def format_rgb(rgb: list[int] | None) -> str | None:
+    """Format an [r, g, b] list from the page as a #rrggbb string."""
+    if rgb is None:
+        return None
+    r, g, b = rgb
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+async def retry_color(page, brick_name: str, color_details: _ColorDetails) -> None:
+    """
+    Click a color again and wait for the URL to change, then update its
+    Element ID and price in place.
+    
+    Used for colors whose click didn't update the URL or the price within
+    the batch's short waits. On timeout, whatever the page shows afterwards is kept, which
+    is right when the color was already selected before its click.
+    """
+    prev_url = page.url
+    click_result = await page.evaluate(CLICK_COLOR_JS, color_details['index'])
+    if not click_result.get('success'):
+        return
+    
+    try:
+        await page.wait_for_function(URL_CHANGED_JS, arg=prev_url, timeout=COLOR_RETRY_TIMEOUT_MS)
+    except PlaywrightTimeoutError:
+        print(f"    ⚠ {brick_name} / {color_details['color_name']}: URL did not change after retrying the click")
+    
+    selected = await page.evaluate(
+        READ_SELECTED_COLOR_JS,
+        {'prevPrice': click_result['prevPrice'], 'stableMs': PRICE_RETRY_STABLE_MS}
+    )
+    color_details.update(_SELECTED_COLOR.validate_python(selected))
+
+
+async def scrape_brick_colors(page, base_element_id: str, brick_name: str) -> BrickItem:
+    """Scrape colors for a single brick type on the given page by clicking each color."""
+    
+    # Navigate directly to the brick's page
+    url = f"https://www.lego.com/en-us/pick-and-build/pick-a-brick?query={base_element_id}"
+    if page.url != url:
+        print(f"  {brick_name}: Loading {url}")
+        # Readiness is checked with wait_for_selector below, so don't wait for
+        # the full load event
+        await page.goto(url, wait_until='domcontentloaded')
+    
+    try:
+        await page.wait_for_selector('[data-test="pab-item-button"]', state='visible', timeout=WAIT_TIMEOUT_MS)
+    except PlaywrightTimeoutError:
+        pass  # Reported as a failed click below
+    
+    # Click the brick and read all of its colors in one round-trip
+    print(f"  {brick_name}: Clicking on brick and getting color information...")
+    result = _HARVEST_RESULT.validate_python(await page.evaluate(HARVEST_COLORS_JS, WAIT_TIMEOUT_MS))
     
-    if not colors_basic:
-        print(f"  ✗ No colors found")
+    if not result['clicked']:
+        print(f"  ✗ {brick_name}: Could not find/click button")
         return BrickItem(element_id=base_element_id, brick_type=brick_name, num_colors=0, colors=[])
     
-    print(f"  Found {len(colors_basic)} colors, now clicking each to get Element ID and price...")
+    colors_found = result['colors']
+    
+    if not colors_found:
+        print(f"  ✗ {brick_name}: No colors found")
+        return BrickItem(element_id=base_element_id, brick_type=brick_name, num_colors=0, colors=[])
+    
+    print(f"  {brick_name}: Found {len(colors_found)} colors")
+    
+    # Only colors that didn't visibly load in the batch pay for a slower retry,
+    # which waits longer for a price that may not have re-rendered
+    for color_details in colors_found:
+        if not (color_details['settled'] and color_details['elementId']):
+            await retry_color(page, brick_name, color_details)
+    
+    # A click whose update landed late can still leave two colors with the
+    # same Element ID, so check those again one at a time
+    id_counts = Counter(c['elementId'] for c in colors_found)
+    for color_details in colors_found:
+        if color_details['elementId'] and id_counts[color_details['elementId']] > 1:
+            await retry_color(page, brick_name, color_details)
+    
+    id_counts = Counter(c['elementId'] for c in colors_found)
+    for color_details in colors_found:
+        if color_details['elementId'] and id_counts[color_details['elementId']] > 1:
+            print(f"    ⚠ {brick_name} / {color_details['color_name']}: Element ID {color_details['elementId']} is shared with another color")
     
-    # Now click each color to get Element ID and price
     all_colors = []
-    for color_info in colors_basic:
-        try:
-            # Click the color button by index
-            click_color_result = await stagehand.page.evaluate(f"""
-                () => {{
-                    const colorButtons = document.querySelectorAll('button[class*="color"]');
-                    const btn = colorButtons[{color_info['index']}];
-                    if (btn) {{
-                        btn.click();
-                        return {{success: true}};
-                    }}
-                    return {{success: false}};
-                }}
-            """)
-            
-            if not click_color_result.get('success'):
-                print(f"    ✗ Could not click {color_info['color_name']}")
-                continue
-            
-            # Wait a bit for the page to update
-            await asyncio.sleep(1.5)
-            
-            # Extract Element ID from URL and price from page
-            color_details = await stagehand.page.evaluate("""
-                () => {
-                    // Get Element ID from URL
-                    const urlMatch = window.location.href.match(/selectedElement=(\\d+)/);
-                    const elementId = urlMatch ? urlMatch[1] : null;
-                    
-                    // Get price
-                    const priceEl = document.querySelector('[data-test="pab-item-price"]');
-                    let price = null;
-                    if (priceEl) {
-                        const priceText = priceEl.textContent.trim();
-                        const priceMatch = priceText.match(/\\$([\\d.]+)/);
-                        price = priceMatch ? parseFloat(priceMatch[1]) : null;
-                    }
-                    
-                    return {elementId, price};
-                }
-            """)
-            
-            if color_details.get('elementId'):
-                all_colors.append(ColorVariant(
-                    color_name=color_info['color_name'],
-                    element_id=color_details['elementId'],
-                    rgb=color_info['rgb'],
-                    price=color_details.get('price')
-                ))
-                print(f"    ✓ {color_info['color_name']}: ID={color_details['elementId']}, Price=${color_details.get('price')}")
-            else:
-                print(f"    ✗ {color_info['color_name']}: Could not get Element ID")
-                
-        except Exception as e:
-            print(f"    ✗ Error with {color_info['color_name']}: {e}")
-            continue
+    for color_details in colors_found:
+        if color_details['elementId']:
+            all_colors.append(ColorVariant(
+                color_name=color_details['color_name'],
+                element_id=color_details['elementId'],
+                rgb=format_rgb(color_details['rgb']),
+                price=color_details['price']
+            ))
+            print(f"    ✓ {brick_name} / {color_details['color_name']}: ID={color_details['elementId']}, Price=${color_details['price']}")
+        else:
+            print(f"    ✗ {brick_name} / {color_details['color_name']}: Could not get Element ID")
     
     if all_colors:
         return BrickItem(
@@ -189,12 +417,182 @@ async def scrape_brick_colors(stagehand, base_element_id: str, brick_name: str)
     return BrickItem(element_id=base_element_id, brick_type=brick_name, num_colors=0, colors=[])
 
 
-async def main():
-    """Main entry point."""
-    print("=" * 70)
-    print("LEGO Pick a Brick - Final Scraper")
-    print("Clicks each color to extract Element ID and Price")
-    print("=" * 70)
+# Process-wide Stagehand session, started on first use by get_stagehand()
+_stagehand: Stagehand | None = None
+_stagehand_lock = asyncio.Lock()
+
+
+async def get_stagehand(keep_alive: bool = False) -> Stagehand:
+    """
+    Return the shared Stagehand session, starting it on first use.
+    
+    If BROWSERBASE_SESSION_ID is set, attaches to that session (e.g. one left
+    open by an earlier run with --keep-alive) instead of paying for a new
+    session startup. With keep_alive, a new session is created so that it
+    outlives this process.
+    """
+    global _stagehand
+    
+    async with _stagehand_lock:
+        if _stagehand is None:
+            session_create_params = None
+            if keep_alive:
+                session_create_params = {
+                    "projectId": os.getenv("BROWSERBASE_PROJECT_ID"),
+                    "keepAlive": True,
+                }
+            
+            config = StagehandConfig(
+                env="BROWSERBASE",
+                api_key=os.getenv("BROWSERBASE_API_KEY"),
+                project_id=os.getenv("BROWSERBASE_PROJECT_ID"),
+                model_name="openai/gpt-4o",
+                model_api_key=os.getenv("OPENAI_API_KEY"),
+                browserbase_session_id=os.getenv("BROWSERBASE_SESSION_ID"),
+                browserbase_session_create_params=session_create_params,
+            )
+            stagehand = Stagehand(config)
+            await stagehand.init()
+            _stagehand = stagehand
+        
+        return _stagehand
+
+
+async def close_stagehand(keep_alive: bool = False) -> None:
+    """Close the shared session, or with keep_alive leave it open for the next run."""
+    global _stagehand
+    
+    async with _stagehand_lock:
+        if _stagehand is None:
+            return
+        
+        if keep_alive:
+            print(f"\nSession left open. Reuse it with: BROWSERBASE_SESSION_ID={_stagehand.session_id}")
+        else:
+            await _stagehand.close()
+        _stagehand = None
+
+
+def parse_args(description: str = "Scrape LEGO Pick a Brick colors.") -> argparse.Namespace:
+    """Parse the command line options shared by the scraper scripts."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        "--keep-alive",
+        action="store_true",
+        help="Leave the Browserbase session open when done and print its ID, "
+             "so a later run can reuse it via BROWSERBASE_SESSION_ID"
+    )
+    parser.add_argument(
+        "--skip-existing",
+        action="store_true",
+        help="Don't re-scrape bricks that already have colors in the output file"
+    )
+    return parser.parse_args()
+
+
+def append_jsonl(f: TextIO, brick: BrickItem) -> None:
+    """Append a brick as one JSON line and make sure it reaches the disk."""
+    f.write(brick.model_dump_json() + "\n")
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def merge_jsonl(jsonl_file: str) -> dict[str, dict]:
+    """
+    Read streamed bricks back, keyed by brick_type. Later lines win, and a
+    line cut off by an interrupted write is skipped.
+    """
+    merged = {}
+    with open(jsonl_file) as f:
+        for line in f:
+            if line.strip():
+                try:
+                    brick = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                merged[brick['brick_type']] = brick
+    return merged
+
+
+async def scrape_all(
+    stagehand,
+    bricks_to_scrape: list[dict],
+    pool_size: int = PAGE_POOL_SIZE,
+    stream: TextIO | None = None
+) -> list[BrickItem]:
+    """
+    Scrape several bricks concurrently, each on its own page of the session.
+    
+    Pages are handed out from a queue, so at most pool_size bricks load at
+    once. Results come back in the same order as bricks_to_scrape. If stream
+    is given, each brick is also appended to it as a JSON line as soon as it
+    finishes, so a crash doesn't lose the bricks already scraped.
+    """
+    pool_size = max(1, min(pool_size, len(bricks_to_scrape)))
+    pages: asyncio.Queue = asyncio.Queue()
+    # Reuse pages already open in the session (e.g. one resumed with
+    # BROWSERBASE_SESSION_ID) before opening new ones
+    for page in (await stagehand.context.get_stagehand_pages())[:pool_size]:
+        pages.put_nowait(page)
+    while pages.qsize() < pool_size:
+        pages.put_nowait(await stagehand.context.new_page())
+    
+    async def worker(idx: int, brick_info: dict) -> BrickItem:
+        page = await pages.get()
+        try:
+            print(f"\n[{idx}/{len(bricks_to_scrape)}] {brick_info['name']} (Element ID: {brick_info['element_id']})")
+            brick_data = await scrape_brick_colors(page, brick_info['element_id'], brick_info['name'])
+            
+            if brick_data.colors:
+                print(f"\n  ✓ {brick_info['name']}: Successfully scraped {len(brick_data.colors)} colors!")
+            else:
+                print(f"\n  ✗ {brick_info['name']}: No colors extracted")
+            return brick_data
+        
+        except Exception as e:
+            print(f"\n  ✗ {brick_info['name']}: Error: {e}")
+            return BrickItem(
+                element_id=brick_info['element_id'],
+                brick_type=brick_info['name'],
+                num_colors=0,
+                colors=[]
+            )
+        finally:
+            pages.put_nowait(page)
+    
+    async def stream_worker(idx: int, brick_info: dict) -> BrickItem:
+        brick_data = await worker(idx, brick_info)
+        if stream is not None:
+            append_jsonl(stream, brick_data)
+        return brick_data
+    
+    return await asyncio.gather(*[
+        stream_worker(idx, brick_info) for idx, brick_info in enumerate(bricks_to_scrape, 1)
+    ])
+
+
+async def run(
+    bricks_to_scrape: list[dict],
+    merge: bool = False,
+    out_path: str = OUTPUT_FILE,
+    keep_alive: bool = False,
+    skip_existing: bool = False
+) -> None:
+    """
+    Scrape the given bricks and save them to out_path.
+    
+    With merge, bricks already in out_path are kept, and each scraped brick
+    replaces the one with the same brick_type or is added at the end.
+    Otherwise out_path is overwritten with just the scraped bricks, in
+    bricks_to_scrape order.
+    
+    With skip_existing, bricks that already have colors in out_path are not
+    scraped again. This implies merge, so that they are kept.
+    
+    Bricks with colors left in the JSONL file by an earlier run that never
+    saved are not scraped again either, and are saved along with the rest.
+    """
+    merge = merge or skip_existing
     
     required_vars = ["BROWSERBASE_API_KEY", "BROWSERBASE_PROJECT_ID", "OPENAI_API_KEY"]
     missing_vars = [var for var in required_vars if not os.getenv(var)]
@@ -205,67 +603,100 @@ async def main():
     
     print("\n✓ All required environment variables are set\n")
     
-    stagehand = None
-    all_bricks = []
+    # Load existing data
+    existing_bricks = []
+    if merge and os.path.exists(out_path):
+        with open(out_path, 'r') as f:
+            existing_bricks = json.load(f)
+        print(f"Loaded {len(existing_bricks)} existing bricks")
     
-    try:
-        config = StagehandConfig(
-            env="BROWSERBASE",
-            api_key=os.getenv("BROWSERBASE_API_KEY"),
-            project_id=os.getenv("BROWSERBASE_PROJECT_ID"),
-            model_name="openai/gpt-4o",
-            model_api_key=os.getenv("OPENAI_API_KEY"),
-        )
-        stagehand = Stagehand(config)
-        await stagehand.init()
-        
-        print(f"View browser: https://www.browserbase.com/sessions/{stagehand.session_id}")
-        print(f"Note: This will take a while as we click each color individually!\n")
+    # Bricks are streamed to a JSONL file as they finish, and it is only
+    # removed once out_path is saved. If it is still here, a run was interrupted.
+    jsonl_file = os.path.splitext(out_path)[0] + ".jsonl"
+    recovered = {}
+    if os.path.exists(jsonl_file):
+        recovered = merge_jsonl(jsonl_file)
+        print(f"Recovered {len(recovered)} bricks streamed by an interrupted run")
         
-        for idx, brick_info in enumerate(BRICKS_TO_SCRAPE, 1):
-            print(f"\n{'='*70}")
-            print(f"[{idx}/{len(BRICKS_TO_SCRAPE)}] {brick_info['name']} (Element ID: {brick_info['element_id']})")
-            print(f"{'='*70}")
+        # Rewrite it so a line cut off mid-write doesn't run into the next one
+        with open(jsonl_file, 'w') as f:
+            for brick in recovered.values():
+                f.write(json.dumps(brick) + "\n")
+    
+    # A brick is done if it lists any colors. The stored num_colors can be stale.
+    done = {t for t, b in recovered.items() if len(b.get('colors', [])) > 0}
+    if skip_existing:
+        done |= {b['brick_type'] for b in existing_bricks if len(b.get('colors', [])) > 0}
+    
+    remaining = [b for b in bricks_to_scrape if b['name'] not in done]
+    if len(remaining) < len(bricks_to_scrape):
+        print(f"Skipping {len(bricks_to_scrape) - len(remaining)} bricks that already have colors")
+    
+    all_bricks = []
+    if remaining:
+        try:
+            stagehand = await get_stagehand(keep_alive)
             
-            try:
-                brick_data = await scrape_brick_colors(stagehand, brick_info['element_id'], brick_info['name'])
-                all_bricks.append(brick_data)
-                
-                if brick_data.colors:
-                    print(f"\n  ✓ Successfully scraped {len(brick_data.colors)} colors!")
-                else:
-                    print(f"\n  ✗ No colors extracted")
-                    
-            except Exception as e:
-                print(f"\n  ✗ Error: {e}")
-                all_bricks.append(BrickItem(
-                    element_id=brick_info['element_id'],
-                    brick_type=brick_info['name'],
-                    num_colors=0,
-                    colors=[]
-                ))
-        
-        # Save results
-        output_file = os.path.join(os.path.dirname(__file__), "bricks_and_plates.json")
-        bricks_data = [brick.model_dump() for brick in all_bricks]
-        
-        with open(output_file, 'w') as f:
-            json.dump(bricks_data, f, indent=2)
-        
-        print(f"\n\n{'=' * 70}")
-        print(f"COMPLETE!")
-        print(f"{'=' * 70}")
-        print(f"Results saved to: {output_file}")
-        print(f"Total bricks processed: {len(all_bricks)}")
-        print(f"Bricks with colors: {sum(1 for b in all_bricks if b.num_colors > 0)}")
-        print(f"Total colors extracted: {sum(b.num_colors for b in all_bricks)}")
-        print("=" * 70)
-        
-    finally:
-        if stagehand:
-            await stagehand.close()
+            print(f"View browser: https://www.browserbase.com/sessions/{stagehand.session_id}")
+            print(f"Note: This will take a while as we click each color individually!\n")
+            
+            # Stream each brick to the JSONL file as it finishes
+            with open(jsonl_file, 'a') as stream:
+                all_bricks = await scrape_all(stagehand, remaining, stream=stream)
+        finally:
+            await close_stagehand(keep_alive)
+    else:
+        print("Nothing left to scrape")
+        if not recovered:
+            return
+    
+    # Scraped and recovered bricks, in bricks_to_scrape order. When merging,
+    # recovered bricks that weren't asked for this time are kept too.
+    streamed = merge_jsonl(jsonl_file)
+    new_bricks = [streamed[b['name']] for b in bricks_to_scrape if b['name'] in streamed]
+    if merge:
+        requested = {b['name'] for b in bricks_to_scrape}
+        new_bricks += [b for t, b in streamed.items() if t not in requested]
+    
+    # Merge with existing data (replace if exists, otherwise add), keyed by
+    # brick_type so existing bricks keep their position
+    merged = {b['brick_type']: b for b in existing_bricks}
+    
+    for new_brick in new_bricks:
+        if merge:
+            if new_brick['brick_type'] in merged:
+                print(f"\n  Replaced {new_brick['brick_type']} in existing data")
+            else:
+                print(f"\n  Added {new_brick['brick_type']} to data")
+        merged[new_brick['brick_type']] = new_brick
+    
+    bricks_data = list(merged.values())
+    
+    # Save results
+    write_json(out_path, bricks_data)
+    
+    os.remove(jsonl_file)
+    
+    print(f"\n\n{'=' * 70}")
+    print(f"COMPLETE!")
+    print(f"{'=' * 70}")
+    print(f"Results saved to: {out_path}")
+    print(f"Total bricks saved: {len(bricks_data)}")
+    print(f"Bricks scraped: {len(all_bricks)}")
+    print(f"Bricks with colors: {sum(1 for b in all_bricks if b.num_colors > 0)}")
+    print(f"Total colors extracted: {sum(b.num_colors for b in all_bricks)}")
+    print("=" * 70)
 
 
-if __name__ == "__main__":
-    asyncio.run(main())
+async def main(keep_alive: bool = False, skip_existing: bool = False):
+    """Main entry point."""
+    print("=" * 70)
+    print("LEGO Pick a Brick - Final Scraper")
+    print("Clicks each color to extract Element ID and Price")
+    print("=" * 70)
+    
+    await run(BRICKS_TO_SCRAPE, keep_alive=keep_alive, skip_existing=skip_existing)
 
+
+if __name__ == "__main__":
+    asyncio.run(main(**vars(parse_args())))
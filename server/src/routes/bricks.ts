@@ -15,7 +15,7 @@ router.get('/', async (req: Request, res: Response) => {
       data: bricks,
       meta: {
         total_bricks: bricks.length,
-        total_colors: bricks.reduce((sum, brick) => sum + brick.num_colors, 0)
+        total_colors: bricks.reduce((sum, brick) => sum + brick.colors.length, 0)
       }
     });
   } catch (error) {
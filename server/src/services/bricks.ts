@@ -23,7 +23,6 @@ export interface ColorVariant {
 export interface BrickItem {
   element_id: string;
   brick_type: string;
-  num_colors: number;
   colors: ColorVariant[];
 }
 